@@ -3,35 +3,67 @@
 import csv
 import dataclasses
 import datetime
+import functools
+import io
+import math
 import os
+import sys
 import typing
 
-import dateutil.parser
-import dateutil.rrule
-import pint.errors
-import pytimeparse.timeparse
-import recurrent
 import yaml
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 SKIP_STRING = "skip"
 
-unit_registry = pint.UnitRegistry()
-recurring_event_parser = recurrent.event_parser.RecurringEvent()
+# Common non-ISO date formats that ask_date tries before falling back to dateutil
+_FAST_DATE_FORMATS = ("%Y/%m/%d", "%m/%d/%Y")
+
+# Seconds per unit for the single-letter suffixes understood by _fast_timeparse,
+# in the order that they have to appear in
+_DURATION_SUFFIX_SECONDS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+
+# pint, recurrent, dateutil, and pytimeparse are imported on first use; pint
+# and recurrent in particular are slow to initialize and may not be needed by
+# every set of questions
+_unit_registry = None
+_recurring_event_parser = None
+
+
+def _get_unit_registry():
+    """ Get the shared `pint.UnitRegistry`, creating it on first use. """
+    global _unit_registry
+    if _unit_registry is None:
+        import pint
+        _unit_registry = pint.UnitRegistry()
+    return _unit_registry
 
 
-@dataclasses.dataclass
+def _get_recurring_event_parser():
+    """ Get the shared `recurrent` parser, creating it on first use. """
+    global _recurring_event_parser
+    if _recurring_event_parser is None:
+        import recurrent.event_parser
+        _recurring_event_parser = recurrent.event_parser.RecurringEvent()
+    return _recurring_event_parser
+
+
+@dataclasses.dataclass(slots=True)
 class Choice:
     value: typing.Any
     label: str
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Response:
     id: str
     value: typing.Any
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class NormalizationResults:
     fieldnames: list[str]
     filler: dict[str, None]
@@ -40,8 +72,8 @@ class NormalizationResults:
 def date_range(first_date: datetime.datetime,
                last_date: datetime.datetime,
                start_with_first: bool = True
-               ) -> typing.Generator[datetime.date, None, None]:
-    """ Yield a generator corresponding to a range of dates.
+               ) -> list[datetime.date]:
+    """ Get a list corresponding to a range of dates.
 
     Args:
         first_date: The date that the range should start with.
@@ -54,10 +86,58 @@ def date_range(first_date: datetime.datetime,
         includes _either_ `first_date` or `last_date` - `start_with_first`
         affects which is included.
     """
-    for i in range((last_date - first_date).days):
-        yield first_date.date() + datetime.timedelta(days=i + (not start_with_first))
+    start = first_date.date().toordinal() + (0 if start_with_first else 1)
+    return [
+        datetime.date.fromordinal(start + i)
+        for i in range((last_date - first_date).days)
+    ]
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_rrule(frequency_string: str) -> str:
+    """ Convert a `recurrent` frequency string into an RRULE string.
+
+    Args:
+        frequency_string: A string describing how often a recurring event
+            occurs.
+
+    Returns: The RRULE string corresponding to `frequency_string`.
+    """
+    rrule_string = _get_recurring_event_parser().parse(frequency_string)
+    if not rrule_string:
+        raise ValueError('Could not parse: "{}"'.format(frequency_string))
+    if isinstance(rrule_string, datetime.datetime):
+        raise ValueError('Not recurring: "{}"'.format(frequency_string))
+    return rrule_string
+
 
+@functools.lru_cache(maxsize=128)
+def _compile_rrule(frequency_string: str):
+    """ Compile a `recurrent` frequency string into a `dateutil.rrule.rrule`.
 
+    The returned rule's `dtstart` is arbitrary; callers should set their own
+    with `rrule.replace(dtstart=...)`, which skips re-parsing the rule.
+
+    Args:
+        frequency_string: A string describing how often a recurring event
+            occurs.
+
+    Returns: The `dateutil.rrule.rrule` corresponding to `frequency_string`, or
+        None if it can't be re-anchored with `replace`: either the rule has its
+        own DTSTART (e.g. "every day starting jan 5"), which must be kept, or it
+        compiles to something other than an `rrule`, such as a `rruleset` (e.g.
+        for rules with exceptions).
+    """
+    import dateutil.rrule
+    rrule_string = _parse_rrule(frequency_string)
+    if "DTSTART" in rrule_string:
+        return
+    rule = dateutil.rrule.rrulestr(rrule_string)
+    if isinstance(rule, dateutil.rrule.rrule):
+        return rule
+
+
+@functools.lru_cache(maxsize=None)
 def days_to_recurring_event(frequency_string: str, date: datetime.date) -> int:
     """ Calculate the number of days to a recurring event.
 
@@ -70,19 +150,70 @@ def days_to_recurring_event(frequency_string: str, date: datetime.date) -> int:
     Returns: The number of days from `date` to the next recurring event defined
         by `frequency_string`.
     """
+    import dateutil.rrule
     dt = datetime.datetime.combine(date, datetime.time())
-    rrule_string = recurring_event_parser.parse(frequency_string)
-    if not rrule_string:
-        raise ValueError('Could not parse: "{}"'.format(frequency_string))
-    if type(rrule_string) is datetime.datetime:
-        raise ValueError('Not recurring: "{}"'.format(frequency_string))
-    next_valid_dt = next(iter(dateutil.rrule.rrulestr(rrule_string, dtstart=dt)))
+    rule = _compile_rrule(frequency_string)
+    if rule is not None:
+        rule = rule.replace(dtstart=dt)
+    else:
+        rule = dateutil.rrule.rrulestr(_parse_rrule(frequency_string), dtstart=dt)
+    next_valid_dt = rule.after(dt, inc=True)
+    if next_valid_dt is None:
+        raise ValueError('No more occurrences: "{}"'.format(frequency_string))
     return (next_valid_dt.date() - dt.date()).days
 
 
+@functools.lru_cache(maxsize=128)
+def _target_quantity(unit: str):
+    """ Parse a unit string into a `pint` Quantity, memoizing the result. """
+    return _get_unit_registry()(unit)
+
+
+@functools.lru_cache(maxsize=128)
+def _conversion_factor(source_units, target_units) -> float:
+    """ Get the factor that converts magnitudes between two units.
+
+    Converting with this factor works on plain numbers instead of pint
+    Quantities. It is only valid for multiplicative units; offset units such as
+    degC and logarithmic units such as dBm have to be converted by `pint`.
+
+    Args:
+        source_units: The multiplicative `pint` Unit that magnitudes are in.
+        target_units: The multiplicative `pint` Unit that magnitudes will be
+            converted to.
+
+    Returns: The factor that a magnitude in `source_units` is multiplied by to
+        get the same quantity in `target_units`.
+    """
+    return _get_unit_registry().Quantity(1, source_units).to(target_units).magnitude
+
+
+def _prompt(message: str) -> str:
+    """ Display a message and read a line of input, like `input()`.
+
+    When stdin is not a terminal, the message is written and the line is read
+    directly, skipping the extra flushes that `input()` does. When stdin is a
+    terminal, `input()` is still used so that line editing keeps working.
+
+    Args:
+        message: The message to display.
+
+    Returns: The line that was read, without the trailing newline.
+    """
+    if sys.stdin.isatty():
+        return input(message)
+    sys.stdout.write(message)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\n")
+
+
 def ask_type(prompt: str,
              type_: type,
-             skippable: bool = True):
+             skippable: bool = True
+             ) -> typing.Optional[typing.Any]:
     """ Ask a question, expecting a specific type.
 
     Args:
@@ -96,13 +227,14 @@ def ask_type(prompt: str,
     `type_` function, if possible, or None if the user responded with
     `SKIP_STRING`.
     """
-    response = input(prompt + "\n{}> ".format(type_.__name__))
-    if skippable and response == SKIP_STRING:
-        return
-    try:
-        return type_(response)
-    except ValueError:
-        ask_type(prompt=prompt, type_=type_, skippable=skippable)
+    while True:
+        response = _prompt(prompt + "\n{}> ".format(type_.__name__))
+        if skippable and response == SKIP_STRING:
+            return
+        try:
+            return type_(response)
+        except ValueError:
+            continue
 
 
 def ask_choice(prompt: str,
@@ -120,21 +252,35 @@ def ask_choice(prompt: str,
     Returns: The value of the selected `Choice`, or None if the user responded
     with `SKIP_STRING`.
     """
-    if type(choices) is not list:
+    if not isinstance(choices, list):
         choices = list(choices)
-    response = input(prompt +
+    lookup = {str(choice.value): choice for choice in choices}
+    # For responses that aren't written exactly like a value (e.g. "01" for 1),
+    # coerce the response at most once per distinct type of value
+    choices_by_type: dict[type, list[Choice]] = {}
+    for choice in choices:
+        choices_by_type.setdefault(type(choice.value), []).append(choice)
+    choice_prompt = (prompt +
                      "\n" +
                      "\n".join([str(choice.value) + ") " + choice.label for choice in choices]) +
                      "\nchoice> ")
-    if skippable and response == SKIP_STRING:
-        return
-    for choice in choices:
-        try:
-            if type(choice.value)(response) == choice.value:
-                return choice
-        except ValueError:
-            pass
-    return ask_choice(prompt=prompt, choices=choices, skippable=skippable)
+    while True:
+        response = _prompt(choice_prompt)
+        if skippable and response == SKIP_STRING:
+            return
+        choice = lookup.get(response)
+        if choice is None:
+            choice = lookup.get(response.strip())
+        if choice is not None:
+            return choice
+        for value_type, candidates in choices_by_type.items():
+            try:
+                coerced = value_type(response)
+            except ValueError:
+                continue
+            for candidate in candidates:
+                if candidate.value == coerced:
+                    return candidate
 
 
 def ask_yn(prompt: str,
@@ -154,18 +300,47 @@ def ask_yn(prompt: str,
     if default:
         if default not in "yn":
             raise ValueError('Default "{}" not in ["y", "n"]'.format(default))
-        response = input(prompt + "\ny/n> ".replace(default, default.upper()))
+        yn_prompt = prompt + "\ny/n> ".replace(default, default.upper())
     else:
-        response = input(prompt + "\ny/n> ")
-    if skippable and response == SKIP_STRING:
-        return
-    elif response == "y":
-        return "y"
-    elif response == "n":
-        return "n"
-    elif default and response == "":
-        return default
-    return ask_yn(prompt=prompt, skippable=skippable)
+        yn_prompt = prompt + "\ny/n> "
+    while True:
+        response = _prompt(yn_prompt)
+        if skippable and response == SKIP_STRING:
+            return
+        elif response == "y":
+            return "y"
+        elif response == "n":
+            return "n"
+        elif default and response == "":
+            return default
+
+
+def _parse_date_fast(date_string: str) -> typing.Optional[datetime.datetime]:
+    """ Parse a date without going through `dateutil`.
+
+    Args:
+        date_string: A date in ISO 8601 format, YYYYMMDD format, or one of
+            `_FAST_DATE_FORMATS`.
+
+    Returns: A `datetime.datetime`, or None if `date_string` is not in one of
+        the formats above.
+    """
+    try:
+        return datetime.datetime.fromisoformat(date_string)
+    except ValueError:
+        pass
+    # strptime's %Y%m%d also accepts fewer digits, e.g. "2026111" as
+    # 2026-11-01, so only use it for exactly 8 digits
+    if len(date_string) == 8 and date_string.isdigit():
+        try:
+            return datetime.datetime.strptime(date_string, "%Y%m%d")
+        except ValueError:
+            pass
+    for date_format in _FAST_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(date_string, date_format)
+        except ValueError:
+            pass
 
 
 def ask_date(prompt: str,
@@ -180,13 +355,65 @@ def ask_date(prompt: str,
     Returns: A `datetime.datetime`, or None if the user responded with
     `SKIP_STRING`.
     """
-    response = input(prompt + "\ndateutil.parser.parse> ")
-    if skippable and response == SKIP_STRING:
+    while True:
+        response = _prompt(prompt + "\ndateutil.parser.parse> ").strip()
+        if not response:
+            continue
+        if skippable and response == SKIP_STRING:
+            return
+        # Common formats are much cheaper to parse than going through
+        # dateutil's heuristics
+        parsed = _parse_date_fast(response)
+        if parsed:
+            return parsed
+        import dateutil.parser
+        try:
+            return dateutil.parser.parse(response)
+        except dateutil.parser.ParserError:
+            continue
+
+
+def _fast_timeparse(duration: str) -> typing.Optional[int]:
+    """ Parse common duration formats without going through `pytimeparse`.
+
+    Args:
+        duration: A duration in the form "H:MM:SS" or a run of integers
+            followed by single-letter units, e.g. "45s", "30m", or "1h 30m".
+            Like with `pytimeparse`, each unit may appear at most once, in
+            w/d/h/m/s order.
+
+    Returns: The number of seconds in `duration`, or None if `duration` is not
+        in one of the forms above.
+    """
+    parts = duration.split(":")
+    if len(parts) == 3:
+        if (all(part.isascii() and part.isdigit() for part in parts)
+                and len(parts[1]) == len(parts[2]) == 2):
+            hours, minutes, seconds = map(int, parts)
+            return hours * 3600 + minutes * 60 + seconds
         return
-    try:
-        return dateutil.parser.parse(response)
-    except dateutil.parser.ParserError:
-        return ask_date(prompt=prompt, skippable=skippable)
+    total = 0
+    digits = ""
+    units_left = "".join(_DURATION_SUFFIX_SECONDS)
+    for char in duration:
+        if char in "0123456789":
+            digits += char
+        elif digits and char in _DURATION_SUFFIX_SECONDS:
+            # A unit that was already used, or that should have come before
+            # the last one, is no longer in units_left
+            position = units_left.find(char)
+            if position == -1:
+                return
+            units_left = units_left[position + 1:]
+            total += int(digits) * _DURATION_SUFFIX_SECONDS[char]
+            digits = ""
+        elif not digits and char == " ":
+            continue
+        else:
+            return
+    if digits or total == 0:
+        return
+    return total
 
 
 def ask_duration_seconds(prompt: str,
@@ -201,13 +428,18 @@ def ask_duration_seconds(prompt: str,
     Returns: An integer corresponding to the number of seconds, or None if the
     user responded with `SKIP_STRING`.
     """
-    response = input(prompt + "\npytimeparse.timeparse.timeparse> ")
-    if skippable and response == SKIP_STRING:
-        return
-    duration = pytimeparse.timeparse.timeparse(response)
-    if duration:
-        return duration
-    return ask_duration_seconds(prompt=prompt, skippable=skippable)
+    while True:
+        response = _prompt(prompt + "\npytimeparse.timeparse.timeparse> ").strip()
+        if not response:
+            continue
+        if skippable and response == SKIP_STRING:
+            return
+        duration = _fast_timeparse(response)
+        if duration is None:
+            import pytimeparse.timeparse
+            duration = pytimeparse.timeparse.timeparse(response)
+        if duration:
+            return duration
 
 
 def ask_quantity(prompt: str,
@@ -229,16 +461,109 @@ def ask_quantity(prompt: str,
     Returns: An integer or float corresponding to the response in units of
     `unit`, or None if the user responded with `SKIP_STRING`.
     """
-    response = input(prompt + "\npint.util.Quantity.to({})> ".format(unit))
-    if skippable and response == SKIP_STRING:
+    while True:
+        response = _prompt(prompt + "\npint.util.Quantity.to({})> ".format(unit)).strip()
+        if not response:
+            continue
+        if skippable and response == SKIP_STRING:
+            return
+        # A bare number is already in units of `unit`, so pint isn't needed.
+        # int() and float() also accept "1_000", and float() accepts "nan" and
+        # "inf", which pint can't convert to `unit`, so those aren't valid
+        # responses here either.
+        if "_" not in response:
+            try:
+                return round(int(response), decimals)
+            except ValueError:
+                pass
+            try:
+                number = float(response)
+            except ValueError:
+                number = None
+            if number is not None:
+                if not math.isfinite(number):
+                    continue
+                return round(number, decimals)
+        import pint.errors
+        unit_registry = _get_unit_registry()
+        target = _target_quantity(unit)
+        try:
+            parsed = unit_registry(response)
+            # is pint.Quantity doesn't work, but the registry's own Quantity does
+            if isinstance(parsed, unit_registry.Quantity):
+                if parsed._is_multiplicative and target._is_multiplicative:
+                    factor = _conversion_factor(parsed.units, target.units)
+                    return round(parsed.magnitude * factor, decimals)
+                return round(parsed.to(target.units).magnitude, decimals)
+            return round(parsed, decimals)
+        except (pint.errors.UndefinedUnitError, pint.errors.DimensionalityError):
+            continue
+
+
+def _ask_choice_question(question: dict[str, typing.Any]) -> typing.Any:
+    """ Ask a "choice" question, returning the value of the selected choice.
+
+    `question` must come from `prepare_questions`, so that its choices are
+    already `Choice` objects.
+    """
+    choice = ask_choice(prompt=question["prompt"], choices=question["choices"])
+    return choice.value if choice is not None else None
+
+
+# Maps each question type to a function that asks a question of that type and
+# returns the response value
+QUESTION_HANDLERS: dict[str, typing.Callable[[dict[str, typing.Any]], typing.Any]] = {
+    "choice": _ask_choice_question,
+    "yn": lambda question: ask_yn(prompt=question["prompt"]),
+    "int": lambda question: ask_type(prompt=question["prompt"], type_=int),
+    "float": lambda question: ask_type(prompt=question["prompt"], type_=float),
+    "duration": lambda question: ask_duration_seconds(prompt=question["prompt"]),
+    "quantity": lambda question: ask_quantity(
+        prompt=question["prompt"],
+        unit=question["unit"],
+        decimals=question["decimals"]
+    ),
+}
+
+
+def read_last_row(csv_path: str,
+                  chunk_size: int = 4096
+                  ) -> typing.Optional[dict[str, str]]:
+    """ Read the last row of a CSV file without reading the entire file.
+
+    The file is read backwards from the end in chunks of `chunk_size` bytes
+    until the last non-empty line is found. Rows are assumed to not contain
+    embedded newlines.
+
+    Args:
+        csv_path: The CSV file to read. Must be uncompressed.
+        chunk_size: The number of bytes to read at a time.
+
+    Returns: A dict mapping the fieldnames in the header to the values of the
+        last row, or None if the file contains no rows besides the header.
+    """
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        fieldnames = next(csv.reader(f), None)
+    if not fieldnames:
         return
-    try:
-        parsed = unit_registry(response)
-        if type(parsed) is type(unit_registry(unit)):  # is pint.Quantity doesn't work
-            return round(parsed.to(unit).magnitude, decimals)
-        return round(parsed, decimals)
-    except (pint.errors.UndefinedUnitError, pint.errors.DimensionalityError):
-        return ask_quantity(prompt=prompt, unit=unit, skippable=skippable)
+
+    with open(csv_path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        buffer = b""
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+            if b"\n" in buffer.rstrip(b"\r\n"):
+                break
+
+    buffer = buffer.rstrip(b"\r\n")
+    newline_index = buffer.rfind(b"\n")
+    if newline_index == -1:  # the only line is the header
+        return
+    last_line = buffer[newline_index + 1:].decode("utf-8")
+    return dict(zip(fieldnames, next(csv.reader([last_line]))))
 
 
 # TODO: can restructure this as a class that wraps around DictWriter and
@@ -252,14 +577,19 @@ def normalize_csv(csv_path: str,
     This function will guarantee that both the original fields from the existing
     CSV file, if any, and all the fields in the `fieldnames` will be present in
     a CSV file at the existing path. In other words, if a CSV file exists at
-    `csv_path` _and_ the existing and desired fields do not match, then the file
-    at `csv_path` will be overwritten to include the set union of both sets of
-    fields.
+    `csv_path` _and_ `fieldnames` contains fields that the existing file does
+    not, then the file at `csv_path` will be overwritten to include the set
+    union of both sets of fields.
 
     If a discrepancy is found and normalization is required, all fields that are
     in `fieldnames` but not in the original CSV file, if any, will be filled in
     with None.
 
+    When fields are only being added, rows are padded without being parsed, so
+    every row is assumed to be exactly as wide as the header, as is the case for
+    files written by this script. Otherwise, short rows are padded to the width
+    of the header and rows that are wider than the header raise a ValueError.
+
     Args:
         csv_path: The CSV file to normalize. Must be uncompressed.
         fieldnames: A list of strings corresponding to the fieldnames that are
@@ -273,28 +603,34 @@ def normalize_csv(csv_path: str,
     # Can optimize this using OrderedDict or similar, but not expecting there
     # to be a very large number of fieldnames or for this to run very often
 
-    if type(fieldnames) is not list:
+    if not isinstance(fieldnames, list):
         fieldnames = list(fieldnames)
 
-    no_change = NormalizationResults(fieldnames=fieldnames, filler=dict())
+    no_change = NormalizationResults(fieldnames=fieldnames, filler={})
 
     if not os.path.isfile(csv_path):
         return no_change
 
-    with open(csv_path, "r") as f:
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
         existing_fieldnames = next(csv.reader(f))
 
-    new_only = set(fieldnames) - set(existing_fieldnames)
-    old_only = set(existing_fieldnames) - set(fieldnames)
+    new_only = frozenset(fieldnames).difference(existing_fieldnames)
+    old_only = frozenset(existing_fieldnames).difference(fieldnames)
     temp_path = csv_path + ".temp"
 
     if len(new_only) + len(old_only) == 0:
         return no_change
 
+    # If fields were only removed, then the existing file already has every
+    # field and rewriting it would not change anything
+    if len(new_only) == 0:
+        return NormalizationResults(fieldnames=existing_fieldnames,
+                                    filler=dict.fromkeys(old_only))
+
     print("Need to normalize {}\n- Unique to existing fieldnames: {}\n- Unique to new fieldnames: {}".format(
         csv_path,
-        ", ".join(list(old_only)) if len(old_only) > 0 else "",
-        ", ".join(list(new_only)) if len(new_only) > 0 else ""
+        ", ".join(old_only),
+        ", ".join(new_only)
     ))
 
     if prompt:
@@ -308,42 +644,122 @@ def normalize_csv(csv_path: str,
         for fieldname in fieldnames
         if fieldname in new_only
     ]
-    new_filler = {
-        fieldname: None
-        for fieldname in new_only
-    }
-    old_filler = {
-        fieldname: None
-        for fieldname in old_only
-    }
-
-    with open(csv_path, "r") as f_in, open(temp_path, "w") as f_out:
-        reader = csv.DictReader(f_in)
-        writer = csv.DictWriter(f_out, fieldnames=combined_fieldnames)
-        writer.writeheader()
-        for old_row in reader:
-            writer.writerow({**old_row, **new_filler})
-
-    os.rename(temp_path, csv_path)
+    old_filler = dict.fromkeys(old_only)
+
+    if len(old_only) == 0:
+        # Only new fields are being added, so each row only needs to have empty
+        # cells appended to it; this can be done on large chunks of the file at
+        # a time without parsing the rows. This can't check row widths, so rows
+        # must already be as wide as the header (see the docstring)
+        header = io.StringIO()
+        csv.writer(header).writerow(combined_fieldnames)
+        row_end = b"," * len(new_only) + b"\r\n"
+        with open(csv_path, "rb") as f_in, open(temp_path, "wb") as f_out:
+            f_in.readline()
+            f_out.write(header.getvalue().encode("utf-8"))
+            remainder = b""
+            while chunk := f_in.read(1 << 20):
+                # Only process whole lines; carry any partial line over
+                chunk = remainder + chunk
+                split = chunk.rfind(b"\n") + 1
+                chunk, remainder = chunk[:split], chunk[split:]
+                chunk = chunk.replace(b"\r\n", b"\n")
+                while b"\n\n" in chunk:  # drop blank lines, as DictReader does
+                    chunk = chunk.replace(b"\n\n", b"\n")
+                f_out.write(chunk.lstrip(b"\n").replace(b"\n", row_end))
+            remainder = remainder.rstrip(b"\r")
+            if remainder:
+                f_out.write(remainder + row_end)
+    else:
+        with open(csv_path, "r", newline="", encoding="utf-8") as f_in, \
+                open(temp_path, "w", newline="", encoding="utf-8") as f_out:
+            reader = csv.reader(f_in)
+            writer = csv.writer(f_out)
+            next(reader)
+            writer.writerow(combined_fieldnames)
+            # The new fields come last, so once a row is as wide as the existing
+            # header, they can be filled in by appending empty cells, which
+            # serialize the same as None
+            width = len(existing_fieldnames)
+            tail = [""] * len(new_only)
+            for old_row in reader:
+                if not old_row:  # skip blank lines, as DictReader does
+                    continue
+                if len(old_row) > width:
+                    raise ValueError("Line {} of {} has {} fields, but the header has {}".format(
+                        reader.line_num, csv_path, len(old_row), width
+                    ))
+                writer.writerow(old_row + [""] * (width - len(old_row)) + tail)
+
+    os.replace(temp_path, csv_path)
 
     if len(old_only) > 0:
         return NormalizationResults(fieldnames=combined_fieldnames, filler=old_filler)
-    return NormalizationResults(fieldnames=combined_fieldnames, filler=dict())
+    return NormalizationResults(fieldnames=combined_fieldnames, filler={})
+
+
+def _get_question_handler(question: dict[str, typing.Any]
+                          ) -> typing.Callable[[dict[str, typing.Any]], typing.Any]:
+    """ Get the function from `QUESTION_HANDLERS` that asks `question`.
+
+    Raises: ValueError if `question` has an unknown type.
+    """
+    try:
+        return QUESTION_HANDLERS[question["type"]]
+    except KeyError:
+        raise ValueError('Unknown question type: "{}"'.format(question["type"]))
+
 
+def prepare_questions(questions: list[dict[str, typing.Any]]
+                      ) -> list[dict[str, typing.Any]]:
+    """ Prepare questions from the config to be asked.
 
-def ask_questions(questions: list[dict[str, typing.Any]],
+    Questions may be asked once for each of many dates, so any work that only
+    depends on the questions themselves is done here, once: question types are
+    checked, choices are converted into `Choice` objects, and frequency rules
+    are parsed. This way, a bad config fails before any prompt.
+
+    Args:
+        questions: A list of questions, as loaded from the config.
+
+    Returns: A list of copies of `questions`, where the choices of each "choice"
+        question are `Choice` objects.
+
+    Raises: ValueError if a question has an unknown type.
+    """
+    prepared = []
+    for question in questions:
+        _get_question_handler(question)
+        _compile_rrule(question["frequency"])
+        if question["type"] == "choice":
+            question = {
+                **question,
+                "choices": [Choice(**args) for args in question["choices"]]
+            }
+        prepared.append(question)
+    return prepared
+
+
+def ask_questions(prepared_questions: list[dict[str, typing.Any]],
                   questions_date: typing.Optional[datetime.date] = None
                   ) -> list[Response]:
     """ Ask a set of questions.
 
     Args:
-        questions: A list of questions to ask. TODO: make a questions spec
+        prepared_questions: A list of questions to ask, as returned by
+            `prepare_questions`. Questions loaded straight from the config must
+            be passed through `prepare_questions` first. TODO: make a questions
+            spec
         questions_date: The date that responses will be written down for. This
             argument is necessary because a user may be filling in responses for
             a day in the past.
 
     Returns: A list of `Response` objects.
     """
+    # Look up every handler before prompting for anything, so that an unknown
+    # question type doesn't lose any answers that were already given
+    handlers = [_get_question_handler(question) for question in prepared_questions]
+
     now = datetime.datetime.now().date()
     now_ymd = now.isoformat()
 
@@ -365,64 +781,30 @@ def ask_questions(questions: list[dict[str, typing.Any]],
         Response(id="recorded", value=now_ymd)
     ]
 
-    for i, question in enumerate(questions):
-
-        print("({}/{})".format(i + 1, len(questions)), end=" ")
+    # Filter out questions that aren't due before asking anything, so that the
+    # progress count only includes questions that will actually be asked
+    active_questions = []
+    for question, handler in zip(prepared_questions, handlers):
         days_until_next_ask = days_to_recurring_event(question["frequency"], questions_date)
-
         if days_until_next_ask > 0:
-            print('Skipping; will ask in {} day{} (frequency rule: "{}")\n'.format(
+            print('Skipping "{}"; will ask in {} day{} (frequency rule: "{}")'.format(
+                question["id"],
                 days_until_next_ask,
                 "" if days_until_next_ask == 1 else "s",
                 question["frequency"]
             ))
-            continue
-
-        # TODO: more dynamic question type parsing
+        else:
+            active_questions.append((question, handler))
+    if len(active_questions) < len(prepared_questions):
+        print("")
 
-        if question["type"] == "choice":
-            choice = ask_choice(
-                prompt=question["prompt"],
-                choices=[Choice(**args) for args in question["choices"]]
-            )
-            responses.append(Response(
-                id=question["id"],
-                value=choice.value if type(choice) is Choice else None
-            ))
+    question_count = len(active_questions)
 
-        elif question["type"] == "yn":
-            responses.append(Response(
-                id=question["id"],
-                value=ask_yn(prompt=question["prompt"])
-            ))
+    for i, (question, handler) in enumerate(active_questions, start=1):
 
-        elif question["type"] == "int":
-            responses.append(Response(
-                id=question["id"],
-                value=ask_type(prompt=question["prompt"], type_=int)
-            ))
+        print("({}/{})".format(i, question_count), end=" ")
 
-        elif question["type"] == "float":
-            responses.append(Response(
-                id=question["id"],
-                value=ask_type(prompt=question["prompt"], type_=float)
-            ))
-
-        elif question["type"] == "duration":
-            responses.append(Response(
-                id=question["id"],
-                value=ask_duration_seconds(prompt=question["prompt"])
-            ))
-
-        elif question["type"] == "quantity":
-            responses.append(Response(
-                id=question["id"],
-                value=ask_quantity(
-                    prompt=question["prompt"],
-                    unit=question["unit"],
-                    decimals=question["decimals"]
-                )
-            ))
+        responses.append(Response(id=question["id"], value=handler(question)))
 
         print("")
 
@@ -431,30 +813,35 @@ def ask_questions(questions: list[dict[str, typing.Any]],
 
 def main():
     with open("config.yaml", "r") as f:
-        config = yaml.load(f, yaml.Loader)
+        config = yaml.load(f, _YamlLoader)
+
+    # Prepare the questions first so that an invalid config fails before
+    # anything is changed on disk
+    questions = prepare_questions(config["questions"])
 
     normalization_results = normalize_csv(
         csv_path=config["path"],
-        fieldnames=["date", "recorded"] + [question["id"] for question in config["questions"]],
+        fieldnames=["date", "recorded"] + [question["id"] for question in questions],
         prompt=True
     )
     if not normalization_results:
         return
 
-    # not necessary for now, but can optimize reading the last line if needed:
-    # https://stackoverflow.com/a/54278929
-    if os.path.isfile(config["path"]):
-        with open(config["path"], "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                pass
-            last_date = datetime.datetime.strptime(row["date"], "%Y-%m-%d")
+    last_row = read_last_row(config["path"]) if os.path.isfile(config["path"]) else None
+    if last_row:
+        last_date = datetime.datetime.fromisoformat(last_row["date"])
+    else:
+        # Nothing has been recorded yet, so only ask questions for today
+        last_date = datetime.datetime.combine(
+            datetime.date.today() - datetime.timedelta(days=1),
+            datetime.time()
+        )
 
-    dates_to_ask = list(date_range(
+    dates_to_ask = date_range(
         first_date=last_date,
         last_date=datetime.datetime.now(),
         start_with_first=False
-    ))
+    )
 
     if len(dates_to_ask) > 1:
         print("Will ask questions for {} dates: {}".format(
@@ -467,35 +854,46 @@ def main():
 
     print('Type "{}" at any time to skip a question, or ^C to quit.\n'.format(SKIP_STRING))
 
-    for date in dates_to_ask:
-        try:
-            responses = ask_questions(config["questions"], questions_date=date)
-        except KeyboardInterrupt:
-            print("\n\nQuitting now\n")
-            return
-
-        print("Responses:")
-        for response in responses:
-            print("- {}: {}".format(response.id, response.value))
-
-        if ask_yn("\nSave these responses?", default="y", skippable=False) == "n":
-            print("\nResponses discarded.")
-            return
-
-        if not os.path.isfile(config["path"]):
-            with open(config["path"], "w") as f:
-                csv.DictWriter(f, fieldnames=normalization_results.fieldnames).writeheader()
-
-        with open(config["path"], "a") as f:
-            csv.DictWriter(f, fieldnames=normalization_results.fieldnames).writerow({
-                **{
-                    response.id: response.value
-                    for response in responses
-                },
-                **normalization_results.filler
-            })
-
-        print("Wrote out {} responses to {}.\n".format(len(responses), config["path"]))
+    # Rows have a fixed shape, so write them out as lists instead of going
+    # through csv.DictWriter. Each row starts as a copy of a template holding
+    # the normalization filler, with every other field left empty.
+    fieldnames = normalization_results.fieldnames
+    fieldnames_index = {fieldname: i for i, fieldname in enumerate(fieldnames)}
+    base_row = [
+        normalization_results.filler.get(fieldname)
+        for fieldname in fieldnames
+    ]
+    write_header = not os.path.isfile(config["path"])
+
+    with open(config["path"], "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(fieldnames)
+
+        for date in dates_to_ask:
+            try:
+                responses = ask_questions(questions, questions_date=date)
+            except KeyboardInterrupt:
+                print("\n\nQuitting now\n")
+                return
+
+            print("Responses:")
+            for response in responses:
+                print("- {}: {}".format(response.id, response.value))
+
+            if ask_yn("\nSave these responses?", default="y", skippable=False) == "n":
+                print("\nResponses discarded.")
+                return
+
+            row = base_row.copy()
+            for response in responses:
+                row[fieldnames_index[response.id]] = response.value
+            writer.writerow(row)
+            # Flush so that saved responses survive the process being killed
+            # while later dates are being asked
+            f.flush()
+
+            print("Wrote out {} responses to {}.\n".format(len(responses), config["path"]))
 
 
 if __name__ == "__main__":